@@ -25,17 +25,26 @@ Last Updated: 22/10/21
 @author: M. J. Michałowski
 """
 
-from math import log, floor, sqrt
 import re
 import sys
 import os
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
+try:
+    from numba import njit
+except ImportError:
+    # numba is optional - without it the kernels below run as plain Python/NumPy
+    def njit(*_args, **_kwargs):
+        """
+        Stand-in for numba.njit which returns the decorated function unchanged.
+        """
+        return lambda function: function
 
 
 # SI units
 GRAVITY_ACCELERATION = 9.81
+ALLOWED_FILE_NAME = re.compile(r"[\w]+$")
 
 
 def user_binary_decision(request, option_true='yes', option_false='no'):
@@ -116,30 +125,35 @@ def numerical_input(variable_information=('name', 'unit'), variable_bounds=None,
                 return variable_values
 
 
-def evaluate_bounces(acceleration, eta, initial_height, minimum_height):
+@njit(parallel=True, cache=True)
+def evaluate_bounces_batch(acceleration, etas, initial_heights, minimum_heights):
     """
-    Evaluates the bouncing ball problem analytically based on provided parameters.
+    Evaluates the bouncing ball problem analytically for many setups at once.
+    It operates on whole arrays so that the logarithms and square roots are
+    computed for all setups in one pass.
 
-    Returns the number of bounces (int) and the time taken for the ball to reach a peak
-    just below the minimum height (float).
+    Returns an array of the numbers of bounces (int) and an array of the times
+    taken (float), one entry per setup.
 
     :acceleration: float
-    :eta: float
-    :initial_height: float
-    :minimum_height: float
+    :etas: numpy array of floats
+    :initial_heights: numpy array of floats
+    :minimum_heights: numpy array of floats
     """
+    # A peak exactly at the minimum height is not counted as a bounce above it
+    exact_bounces = np.log(minimum_heights/initial_heights) / np.log(etas)
+    floor_bounces = np.floor(exact_bounces)
+    numbers_of_bounces = np.where(exact_bounces == floor_bounces,
+                                  floor_bounces - 1, floor_bounces).astype(np.int64)
 
-    number_of_bounces = log(minimum_height/initial_height)/log(eta)
-    if number_of_bounces == floor(number_of_bounces):
-        number_of_bounces = floor(number_of_bounces) - 1
-    else:
-        number_of_bounces = floor(number_of_bounces)
-
-    time_elapsed = (2*initial_height/acceleration)**0.5
-    for i in range(1, number_of_bounces+1):
-        time_elapsed += 2 * (2*initial_height*(eta**i)/acceleration)**0.5
+    # The times of flight between bounces form a geometric series in sqrt(eta),
+    # so the total is evaluated in closed form instead of summing bounce by bounce.
+    # eta is bounded to (0, 1) by the input validation, so 1 - sqrt(eta) is never 0
+    sqrt_etas = np.sqrt(etas)
+    geometric_sums = sqrt_etas * (1 - sqrt_etas**numbers_of_bounces) / (1 - sqrt_etas)
+    times_elapsed = np.sqrt(2*initial_heights/acceleration) * (1 + 2*geometric_sums)
 
-    return number_of_bounces, time_elapsed
+    return numbers_of_bounces, times_elapsed
 
 
 def display_table_results(table):
@@ -150,9 +164,8 @@ def display_table_results(table):
     :table: pandas dataframe
     """
     pd.set_option('display.max_columns', None)
-    column_formatting = {'Time [s]': '{:0.2f}', 'Number of Bounces': '{:0.0f}'}
-    for column, formatting in column_formatting.items():
-        table[column] = table[column].map(lambda _: formatting.format(_))
+    table['Time [s]'] = np.char.mod('%0.2f', table['Time [s]'].to_numpy(dtype=np.float64))
+    table['Number of Bounces'] = table['Number of Bounces'].astype(np.int64).astype(str)
 
     print(table)
 
@@ -168,11 +181,10 @@ def save_to_csv(table):
 
     :table: pandas dataframe
     """
-    allowed_file_name = r"[\w]+$"
     while True:
         while True:
             user_file_name = input('Please enter the name for the csv file:')
-            if not re.match(allowed_file_name, user_file_name):
+            if not ALLOWED_FILE_NAME.match(user_file_name):
                 print('The name is invalid. Please enter a valid file name.')
             else:
                 break
@@ -230,21 +242,19 @@ def show_plot(number_of_bounces, eta_coefficient, acceleration,
     :min_height: float
     """
     time_step = 1 / (50 * acceleration)
-    time_of_bounce = [sqrt(2 * max_height / acceleration)]
-    time = np.arange(0, time_of_bounce[0] + time_step, time_step)
-    height_path = -0.5 * acceleration * time**2 + max_height
-
-    for i in range(1, int(number_of_bounces)+2):
-        time_of_bounce.append(sqrt(2 * (eta_coefficient**i) * max_height / acceleration))
-        time_temporary = np.arange(-time_of_bounce[i], time_of_bounce[i] + time_step, time_step)
+    peak_heights = max_height * eta_coefficient**np.arange(int(number_of_bounces) + 2)
+    time_of_bounce = np.sqrt(2 * peak_heights / acceleration)
 
-        height_path_temporary = (-0.5 * acceleration * time_temporary**2) \
-                                + (max_height * eta_coefficient**i)
-        time_temporary = time_temporary + time_of_bounce[0] \
-                         + 2*sum(time_of_bounce[1:i]) + time_of_bounce[i]
+    # Segment k is a parabola peaking at peak_times[k] and ending at ground_times[k].
+    ground_times = time_of_bounce[0] + np.concatenate(([0], np.cumsum(2 * time_of_bounce[1:])))
+    peak_times = ground_times - time_of_bounce
 
-        time = np.concatenate((time, time_temporary), axis=None)
-        height_path = np.concatenate((height_path, height_path_temporary), axis=None)
+    # The peaks and ground contacts are added to the uniform grid so that even
+    # bounces shorter than the time step are drawn.
+    time = np.union1d(np.arange(0, ground_times[-1], time_step),
+                      np.concatenate((peak_times, ground_times)))
+    segment = np.searchsorted(ground_times, time)
+    height_path = -0.5 * acceleration * (time - peak_times[segment])**2 + peak_heights[segment]
 
     display_higher_resolution = user_binary_decision(request='Do you want to display a'
                                                              ' higher resolution plot'
@@ -272,10 +282,9 @@ def show_plot(number_of_bounces, eta_coefficient, acceleration,
                                      option_true='yes',
                                      option_false='no')
     if save_plot:
-        allowed_file_name = r"[\w]+$"
         while True:
             user_file_name = input('Please enter the name for the png file:')
-            if not re.match(allowed_file_name, user_file_name):
+            if not ALLOWED_FILE_NAME.match(user_file_name):
                 print('The name is invalid. Please enter a valid file name.')
             elif os.path.isfile(f'./{user_file_name}.png'):
                 print('Sorry, the chosen name is already in use. Please'
@@ -329,19 +338,21 @@ def main():
                                        eta_bounds, list_length=list_length)
     print()
 
-    table_of_results = pd.DataFrame(columns=['Initial Height [m]', 'Minimum Height [m]', 'Eta',
-                                             'Number of Bounces', 'Time [s]'])
-    for i in range(list_length):
-        number_of_bounces, time_elapsed = evaluate_bounces(acceleration=gravity_acceleration,
-                                                           eta=eta_coefficients[i],
-                                                           initial_height=initial_heights[i],
-                                                           minimum_height=minimum_heights[i])
-
-        table_of_results.loc[i] = [initial_heights[i], minimum_heights[i], eta_coefficients[i],
-                                   number_of_bounces, time_elapsed]
-        if display_text_results:
-            print(f'Initial Height = {initial_heights[i]}m ; Minimum Height = {minimum_heights[i]}m'
-                  f' ; Eta = {eta_coefficients[i]}')
+    numbers_of_bounces, times_elapsed = evaluate_bounces_batch(
+        gravity_acceleration, np.array(eta_coefficients, dtype=np.float64),
+        np.array(initial_heights, dtype=np.float64), np.array(minimum_heights, dtype=np.float64))
+    table_of_results = pd.DataFrame({'Initial Height [m]': initial_heights,
+                                     'Minimum Height [m]': minimum_heights,
+                                     'Eta': eta_coefficients,
+                                     'Number of Bounces': numbers_of_bounces,
+                                     'Time [s]': times_elapsed})
+
+    if display_text_results:
+        for initial_height, minimum_height, eta, number_of_bounces, time_elapsed in zip(
+                initial_heights, minimum_heights, eta_coefficients,
+                numbers_of_bounces, times_elapsed):
+            print(f'Initial Height = {initial_height}m ; Minimum Height = {minimum_height}m'
+                  f' ; Eta = {eta}')
             print(f'The ball will bounce {number_of_bounces} times in {time_elapsed:0.2f}s.\n')
 
     if not display_text_results:
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, create_engine
+from sqlalchemy import Column, Integer, String, create_engine, update
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -109,16 +109,13 @@ def check_whether_learned(session, current_flashcard):
 
 def study_flashcards(session):
     flashcards = session.query(Flashcard).all()
-    not_studied_flashcard = 0
+    not_studied_ids = []
 
     for current_flashcard in flashcards:
         if current_flashcard.sessions_since_last_studied < current_flashcard.box - 1:
-            current_flashcard.sessions_since_last_studied += 1
-            not_studied_flashcard += 1
-            if not_studied_flashcard == len(flashcards):
+            not_studied_ids.append(current_flashcard.id)
+            if len(not_studied_ids) == len(flashcards):
                 print('There are no flashcards to practice!')
-                break
-            session.commit()
             continue
 
 
@@ -149,6 +146,13 @@ def study_flashcards(session):
             else:
                 print(f'{user_choice} is not an option')
 
+    if not_studied_ids:
+        session.execute(update(Flashcard)
+                        .where(Flashcard.id.in_(not_studied_ids))
+                        .values(sessions_since_last_studied=Flashcard.sessions_since_last_studied + 1)
+                        .execution_options(synchronize_session=False))
+        session.commit()
+
 
 def main():
     session, flashcards = load_database('flashcard.db')
@@ -168,8 +172,7 @@ def main():
             add_flashcards(session, last_flashcard_id)
 
         elif user_choice == '2':
-            _, flashcards = load_database('flashcard.db')
-            if flashcards:
+            if session.query(Flashcard).first():
                 study_flashcards(session)
             else:
                 print("There are no flashcards to practice!")
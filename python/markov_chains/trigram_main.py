@@ -1,34 +1,36 @@
-from nltk.tokenize import WhitespaceTokenizer
 import collections
-from random import choices, seed, choice
-from time import time_ns
-import re
+from itertools import accumulate
+from random import choice
+import numpy as np
 
 
-tk = WhitespaceTokenizer()
-with open('your_file.txt', 'r', encoding='UTF-8') as corpus:
-    text = corpus.read()
-    word_list = tk.tokenize(text)
+PUNCTUATION = frozenset('.!?')
+RANDOM_POOL_SIZE = 1024
 
-trigrams_list = [(word_list[i] + ' ' + word_list[i+1], word_list[i+2]) for i in range(len(word_list) - 2)]
-freq_counter = collections.Counter(trigrams_list)
-markov_dict = {}
+markov_dict = collections.defaultdict(collections.Counter)
+window = collections.deque(maxlen=3)
+with open('your_file.txt', 'r', encoding='UTF-8') as corpus:
+    for line in corpus:
+        for word in line.split():
+            window.append(word)
+            if len(window) == 3:
+                markov_dict[(window[0], window[1])][window[2]] += 1
 
-for (head, tail), count in freq_counter.items():
-    markov_dict.setdefault(head, {})
-    markov_dict[head][tail] = count
+sampler = {head: (tuple(tails), np.fromiter(accumulate(tails.values()), dtype=np.float64))
+           for head, tails in markov_dict.items()}
 
+starting_words = [head for head in markov_dict
+                  if head[0][0].isupper() and all(PUNCTUATION.isdisjoint(word) for word in head)]
 
-for _ in range(10):
-    seed(time_ns())
+rng = np.random.default_rng()
+random_pool = rng.random(RANDOM_POOL_SIZE)
+pool_index = 0
 
-    while True:
-        current_words = choice([key for key in markov_dict.keys()])
 
-        if current_words[0].isupper() and not bool(re.match('.*[.!?].*', current_words)):
-            break
-
-    print(current_words, end=' ')
+for _ in range(10):
+    current_words = choice(starting_words)
+    print(*current_words, end=' ')
+    last_word = current_words[1]
     i = 0
     sentence_continues = True
 
@@ -36,14 +38,20 @@ for _ in range(10):
         i += 1
 
         while True:
-            new_word = choices([tail for tail in markov_dict[current_words].keys()],
-                               [count for count in markov_dict[current_words].values()])[0]
-
-            if i > 2 and bool(re.match('.*[.!?]', new_word)):
+            if pool_index == RANDOM_POOL_SIZE:
+                random_pool = rng.random(RANDOM_POOL_SIZE)
+                pool_index = 0
+            tails, cum_weights = sampler[current_words]
+            new_word = tails[np.searchsorted(cum_weights, random_pool[pool_index]*cum_weights[-1],
+                                             side='right')]
+            pool_index += 1
+
+            if i > 2 and not PUNCTUATION.isdisjoint(new_word):
                 sentence_continues = False
             break
 
         print(new_word, end=' ')
-        current_words = current_words.split()[1] + ' ' + new_word
+        current_words = (last_word, new_word)
+        last_word = new_word
 
     print()
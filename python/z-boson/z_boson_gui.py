@@ -18,8 +18,8 @@ default case. If the user wants to consider new decay products, a different
 data file has to be provided.
 
 Having performed the minimisation, the script displays and saves the best fit plot
-alongside its residues plot. Furthermore, in the default case it also displays and
-saves the chi squared surface plot against the two free parameters. All plots are
+alongside its residues plot. Furthermore, in the default case it can also display and
+save the chi squared surface plot against the two free parameters. All plots are
 saved in folder named 'SavedFigures' in the same directory as this script.
 
 Finally, it displays the numerical values and uncertainties for mass, width and
@@ -35,24 +35,40 @@ Last Updated: 14/12/21
 @author: M. J. Michałowski
 """
 
-from re import match
 import sys
-from os import mkdir
-from os.path import exists
-from tkinter import Button, Label, Entry, StringVar, Radiobutton, BooleanVar, Tk
+from functools import lru_cache
+from glob import glob
+from os import makedirs
+from os.path import basename, exists, getmtime
+from re import escape, fullmatch
+from tkinter import Button, Label, Entry, StringVar, Radiobutton, BooleanVar, Checkbutton, Tk
 from tkinter.ttk import Combobox
 from tkinter.filedialog import askopenfilenames
-import matplotlib.pyplot as plt
 import numpy as np
-import scipy.optimize as so
+try:
+    from numba import njit, prange
+except ImportError:
+    # numba is optional - without it the kernels below run as plain NumPy
+    prange = range
+
+    def njit(*_args, **_kwargs):
+        """
+        Stand-in for numba.njit which returns the decorated function unchanged.
+        """
+        return lambda function: function
 
 
 FILE_NAMES = ['z_boson_data_1.csv', 'z_boson_data_2.csv']
+FIGURE_FOLDER = 'SavedFigures'
+FIGURE_DPI = 150
+# The physical constants below are read by the njit kernels, which fold them in as
+# compile-time constants - changing them at runtime does not affect compiled kernels.
 GAMMA_EE = 0.08391  # GeV
 H_BAR = 6.582119569 * 10**(-25)  # GeV*s
 M_Z0 = 91.179  # GeV/c^2  --  initial guess
 GAMMA_Z0 = 2.510  # GeV  --  initial guess
 CONVERSION_FACTOR = 3.894 * 10**5  # nb
+TWELVE_PI = 12 * np.pi
 
 
 def read_data(file_names):
@@ -68,27 +84,60 @@ def read_data(file_names):
     :return: combined data as np.array
     """
 
-    output_array = []
+    file_arrays = []
     successful_file_imports = len(file_names)
     for file_name in file_names:
         try:
-            with open(file_name, 'r') as file:
-                for line in file:
-                    try:
-                        if match('.*nan.*', line):
-                            continue
-                        line = [float(entry) for entry in line.split(',')]
-                        if line[2] <= 0 or line[1] < 0 or line[0] < 0:
-                            continue
-                        output_array.append(line)
-                    except ValueError:
-                        pass
+            # non-numerical entries are read in as nan and removed by the mask below,
+            # so no separate check for 'nan' strings in the file is needed
+            file_arrays.append(np.genfromtxt(file_name, delimiter=',', usecols=(0, 1, 2),
+                                             invalid_raise=False).reshape(-1, 3))
         except FileNotFoundError:
             successful_file_imports -= 1
 
     message = f'{successful_file_imports}/{len(file_names)} files have been imported successfully.'
-    output_array.sort(key=lambda l: l[0])
-    return np.array(output_array), message
+    if not file_arrays:
+        return np.empty((0, 3)), message
+
+    output_array = np.concatenate(file_arrays, axis=0)
+    valid = np.isfinite(output_array).all(axis=1) & (output_array[:, 2] > 0) \
+        & (output_array[:, 1] >= 0) & (output_array[:, 0] >= 0)
+    output_array = output_array[valid]
+    return output_array[np.argsort(output_array[:, 0], kind='stable')], message
+
+
+@lru_cache(maxsize=8)
+def _read_data_cached(file_names, modification_times):
+    """
+    Cached call of read_data. The modification times are only part of the cache key,
+    so that the files are read again whenever any of them changes. The returned array
+    is shared between calls and is therefore made read-only.
+
+    :param file_names: tuple of pathname-strings
+    :param modification_times: tuple of modification times of the files (None if missing)
+
+    :return: combined data as np.array, message about the imported files
+    """
+
+    data, message = read_data(file_names)
+    data.flags.writeable = False
+    return data, message
+
+
+def read_data_cached(file_names):
+    """
+    Same as read_data, but files which have not changed since they were last read
+    are not imported and parsed again.
+
+    :param file_names: list of pathname-strings
+
+    :return: combined data as np.array, message about the imported files
+    """
+
+    file_names = tuple(file_names)
+    modification_times = tuple(getmtime(file_name) if exists(file_name) else None
+                               for file_name in file_names)
+    return _read_data_cached(file_names, modification_times)
 
 
 def initial_filter(data):
@@ -105,49 +154,94 @@ def initial_filter(data):
 
     mean = np.average(data[:, 1])
     sigma = np.std(data[:, 1])
-    new_data = []
-    for entry in data:
-        if np.abs(mean - entry[1]) < 5*sigma:
-            new_data.append(entry)
-    return np.array(new_data)
+    return data[np.abs(mean - data[:, 1]) < 5*sigma]
 
 
-def filter_data(data, func, popt, gamma_ee_unknown=False):
+def filter_data(energy, observed, error, func, popt, gamma_ee_unknown=False, residuals=None):
     """
     Performs a more specific filtering of the data based on the predicted
     distribution the data points are supposed to follow. For each point,
     it calculates the predicted cross section for its energy and then
     removes this point if it lies further away than 4 sigma
-    from that prediction.
+    from that prediction. If the residuals of the fit are already known,
+    they are used instead of evaluating the distribution again.
 
-    :param data: np.array of unfiltered data
+    :param energy: np.array of unfiltered energy values
+    :param observed: np.array of unfiltered cross section values
+    :param error: np.array of unfiltered cross section uncertainties
     :param func: the expected distribution function
     :param popt: np.array of the values of free parameters after initial fitting
     :param gamma_ee_unknown: False by default, True if partial width for electron-positron
                              is to be treated a free parameter
+    :param residuals: np.array of the residuals of the fit at popt, None by default
 
-    :return: np.array of filtered data, list of outlier points
+    :return: np.array of booleans - True for the points to keep, False for outliers
     """
 
-    if len(popt) == 2:
-        deviation_array = np.abs(data[:, 1] - func(data[:, 0], popt[0], popt[1]))
+    if residuals is not None:
+        deviation_array = np.abs(residuals)
+    elif len(popt) == 2:
+        deviation_array = np.abs(observed - func(energy, popt[0], popt[1]))
     elif len(popt) == 3 and gamma_ee_unknown:
-        deviation_array = np.abs(data[:, 1] - func(data[:, 0], popt[0], popt[1], popt[2], popt[2]))
+        deviation_array = np.abs(observed - func(energy, popt[0], popt[1], popt[2], popt[2]))
     else:
-        deviation_array = np.abs(data[:, 1] - func(data[:, 0], popt[0], popt[1], popt[2]))
+        deviation_array = np.abs(observed - func(energy, popt[0], popt[1], popt[2]))
 
     mean = np.average(deviation_array)
     sigma = np.std(deviation_array)
     z_scores = (deviation_array - mean)/sigma
-    new_data = []
-    outliers = []
-    for z_score, entry in zip(z_scores, data):
-        if z_score < 4:
-            new_data.append(entry)
-        else:
-            outliers.append(entry)
+    return z_scores < 4
+
+
+@njit(cache=True, fastmath=True)
+def _breit_wigner(energy, m_z, gamma_z, gamma_vertex_1, gamma_vertex_2):
+    """
+    Compiled kernel of the Breit-Wigner expression used by cross_section.
+    """
+
+    energy_squared = energy * energy
+    m_z_squared = m_z * m_z
+    energy_difference = energy_squared - m_z_squared
+    return (TWELVE_PI / m_z_squared) * gamma_vertex_1 * gamma_vertex_2 * CONVERSION_FACTOR * \
+           (energy_squared / (energy_difference*energy_difference + (gamma_z*m_z)**2))
 
-    return np.array(new_data), outliers
+
+@njit(cache=True, fastmath=True)
+def _chi_square_kernel(energy, observed, error, m_z, gamma_z, gamma_vertex_1, gamma_vertex_2):
+    """
+    Compiled kernel of chi_square for the Breit-Wigner expression. The weighted
+    residuals are squared and summed by a single dot product.
+    """
+
+    residuals = (observed - _breit_wigner(energy, m_z, gamma_z,
+                                          gamma_vertex_1, gamma_vertex_2)) / error
+    return residuals @ residuals
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def _chi_square_surface_kernel(energy, observed, error, m_z_array, gamma_z_array):
+    """
+    Compiled kernel evaluating chi squared on the grid of m_z and gamma_z values
+    (with the default partial widths). The rows of the grid are computed in parallel
+    and each cell sums its residuals point by point, without temporary arrays.
+    """
+
+    surface = np.empty((len(m_z_array), len(gamma_z_array)))
+    for i in prange(len(m_z_array)):
+        m_z_squared = m_z_array[i] * m_z_array[i]
+        prefactor = (TWELVE_PI / m_z_squared) * GAMMA_EE * GAMMA_EE * CONVERSION_FACTOR
+        for j in range(len(gamma_z_array)):
+            width_term = (gamma_z_array[j] * m_z_array[i])**2
+            chi_squared = 0.0
+            for k in range(len(energy)):
+                energy_squared = energy[k] * energy[k]
+                energy_difference = energy_squared - m_z_squared
+                predicted = prefactor * \
+                    (energy_squared / (energy_difference*energy_difference + width_term))
+                residual = (observed[k] - predicted) / error[k]
+                chi_squared += residual * residual
+            surface[i, j] = chi_squared
+    return surface
 
 
 def cross_section(energy, m_z=M_Z0, gamma_z=GAMMA_Z0,
@@ -165,15 +259,44 @@ def cross_section(energy, m_z=M_Z0, gamma_z=GAMMA_Z0,
     :return: np.array of predicted cross section values at energies provided
     """
 
-    return ((12*np.pi) / (m_z**2)) * gamma_vertex_1 * gamma_vertex_2 * CONVERSION_FACTOR * \
-           (energy**2 / ((energy**2 - m_z**2)**2 + (gamma_z*m_z)**2))
+    return _breit_wigner(energy, m_z, gamma_z, gamma_vertex_1, gamma_vertex_2)
 
 
-def chi_square(data, popt, gamma_ee_unknown, func=cross_section):
+def cross_section_jacobian(energy, m_z=M_Z0, gamma_z=GAMMA_Z0,
+                           gamma_vertex_1=GAMMA_EE, gamma_vertex_2=GAMMA_EE):
+    """
+    The analytic Jacobian of the Breit-Wigner expression, i.e. the partial
+    derivatives of cross_section with respect to each of its parameters.
+
+    :param energy: np.array of energy values
+    :param m_z: float - mass of Z Boson
+    :param gamma_z: float - width of Z Boson
+    :param gamma_vertex_1: float - partial width of the first vertex
+    :param gamma_vertex_2: float - partial width of the second vertex
+
+    :return: np.array of shape (len(energy), 4) with the derivatives with respect to
+             m_z, gamma_z, gamma_vertex_1 and gamma_vertex_2 (in that order)
+    """
+
+    predicted = cross_section(energy, m_z, gamma_z, gamma_vertex_1, gamma_vertex_2)
+    energy_difference = energy**2 - m_z**2
+    denominator = energy_difference**2 + (gamma_z*m_z)**2
+
+    d_m_z = predicted * (-2/m_z + (4*m_z*energy_difference - 2*gamma_z**2*m_z) / denominator)
+    d_gamma_z = -predicted * 2*gamma_z*m_z**2 / denominator
+    d_gamma_vertex_1 = predicted / gamma_vertex_1
+    d_gamma_vertex_2 = predicted / gamma_vertex_2
+
+    return np.column_stack((d_m_z, d_gamma_z, d_gamma_vertex_1, d_gamma_vertex_2))
+
+
+def chi_square(energy, observed, error, popt, gamma_ee_unknown, func=cross_section):
     """
     The chi squared function.
 
-    :param data: np.array of data
+    :param energy: np.array of energy values
+    :param observed: np.array of measured cross section values
+    :param error: np.array of cross section uncertainties
     :param popt: np.arrays of floats - values of the fitted parameters
     :param gamma_ee_unknown: True if partial width for electron-positron is unknown,
                              False otherwise
@@ -181,16 +304,18 @@ def chi_square(data, popt, gamma_ee_unknown, func=cross_section):
 
     :return: float - chi squared value of the fit
     """
-    observed = data[:, 1]
-    error = data[:, 2]
     if len(popt) == 2:
-        predicted = func(data[:, 0], popt[0], popt[1])
+        parameters = (popt[0], popt[1], GAMMA_EE, GAMMA_EE)
     elif len(popt) == 3 and gamma_ee_unknown:
-        predicted = func(data[:, 0], popt[0], popt[1], popt[2], popt[2])
+        parameters = (popt[0], popt[1], popt[2], popt[2])
     else:
-        predicted = func(data[:, 0], popt[0], popt[1], popt[2])
+        parameters = (popt[0], popt[1], popt[2], GAMMA_EE)
 
-    return np.sum((observed - predicted)**2 / error**2)
+    if func is cross_section:
+        return _chi_square_kernel(energy, observed, error, *parameters)
+
+    residuals = (observed - func(energy, *parameters)) / error
+    return float(residuals @ residuals)
 
 
 def check_numerical_input(value):
@@ -208,11 +333,52 @@ def check_numerical_input(value):
         return False
 
 
-def fit_to_data(data, different_decay, gamma_ee_unknown, custom_gamma=0.01, func=cross_section):
+def least_squares_fit(model, model_jacobian, energy, observed, error, p0):
     """
-    The core component of the script. Employs scipy.curve_fit to minimise chi squared
-    value and thus find the optimal parameter values. The function has three distinct
-    branches which analyse the default and optional scenarios.
+    Minimises the chi squared of the model with the Levenberg-Marquardt
+    algorithm of scipy.optimize.least_squares. Unlike scipy.curve_fit, it does
+    not calculate the covariance matrix, which is only needed after the last fit.
+
+    :param model: function of energy and the free parameters
+    :param model_jacobian: the Jacobian of model with respect to the free parameters
+    :param energy: np.array of energy values
+    :param observed: np.array of measured cross section values
+    :param error: np.array of cross section uncertainties
+    :param p0: list of initial guesses for the free parameters
+
+    :return: scipy.optimize.OptimizeResult of the fit
+    """
+    # scipy and matplotlib are imported on first use to keep the GUI startup fast
+    import scipy.optimize as so
+
+    return so.least_squares(lambda p: (model(energy, *p) - observed) / error, p0,
+                            jac=lambda p: model_jacobian(energy, *p) / error[:, np.newaxis],
+                            method='lm')
+
+
+def covariance_matrix(fit_result):
+    """
+    Estimates the covariance matrix of the fitted parameters from the Jacobian
+    at the minimum, scaled by the reduced chi squared (as done by scipy.curve_fit).
+
+    :param fit_result: scipy.optimize.OptimizeResult returned by least_squares_fit
+
+    :return: np.array of covariance matrix
+    """
+
+    jacobian = fit_result.jac
+    chi_squared_red = 2*fit_result.cost / (len(fit_result.fun) - len(fit_result.x))
+    return np.linalg.inv(jacobian.T @ jacobian) * chi_squared_red
+
+
+def fit_to_data(data, different_decay, gamma_ee_unknown, custom_gamma=0.01, func=cross_section,
+                func_jacobian=cross_section_jacobian):
+    """
+    The core component of the script. Employs scipy.optimize.least_squares to minimise
+    chi squared value and thus find the optimal parameter values. The function sets up
+    the model for one of three scenarios (the default and two optional ones) and then
+    fits it, removing outliers until none are left. The analytic Jacobian is passed on
+    to the fit so that it does not have to be estimated numerically.
 
     :param data: np.array of data
     :param different_decay: True if option to analyse new decay products was selected,
@@ -221,73 +387,117 @@ def fit_to_data(data, different_decay, gamma_ee_unknown, custom_gamma=0.01, func
                              as a free parameter was selected, False otherwise
     :param custom_gamma: float - user's guess for the optional partial widths
     :param func: the predicted distribution function
+    :param func_jacobian: the Jacobian of func with respect to its four parameters
 
-    :return: np.array of data, np.array of parameters, np.array of covariance matrix
-             and gamma_ee_unknown
+    :return: tuple of the filtered energy, cross section and uncertainty arrays,
+             np.array of parameters, np.array of covariance matrix and gamma_ee_unknown
     """
     data = initial_filter(data)
-    popt, pcov = [], []
-
+    # The columns are copied into contiguous arrays once, so that the repeated
+    # calculations below do not have to work on strided views of data. Outliers
+    # are then removed by updating a mask over these arrays instead of rebuilding them.
+    all_energy, all_observed, all_error = (np.ascontiguousarray(column) for column in data.T)
+    mask = np.ones(len(all_energy), dtype=bool)
+
+    # The free parameters of func depend on the chosen scenario, so the model and its
+    # Jacobian are set up once here and the same fitting loop is used for all of them.
     if different_decay:
-        gamma_decay = custom_gamma
-        outliers = True
-        while outliers:
-            popt, pcov = so.curve_fit(lambda x, a, b, c: func(x, a, b, c, GAMMA_EE),
-                                      data[:, 0], data[:, 1], p0=[91.179, 2.510, gamma_decay],
-                                      sigma=data[:, 2])[:2]
-            data, outliers = filter_data(data, func, popt)
+        def model(x, a, b, c):
+            return func(x, a, b, c, GAMMA_EE)
+
+        def model_jacobian(x, a, b, c):
+            return func_jacobian(x, a, b, c, GAMMA_EE)[:, :3]
+
+        p0 = [M_Z0, GAMMA_Z0, custom_gamma]
 
     elif gamma_ee_unknown:
-        gamma_ee = custom_gamma
-        outliers = True
-        while outliers:
-            popt, pcov = so.curve_fit(lambda x, a, b, c: func(x, a, b, c, c),
-                                      data[:, 0], data[:, 1], p0=[91.179, 2.510, gamma_ee],
-                                      sigma=data[:, 2])[:2]
-            data, outliers = filter_data(data, func, popt, gamma_ee_unknown)
+        def model(x, a, b, c):
+            return func(x, a, b, c, c)
+
+        def model_jacobian(x, a, b, c):
+            # both vertices depend on the same fitted partial width
+            partials = func_jacobian(x, a, b, c, c)
+            return np.column_stack((partials[:, :2], partials[:, 2] + partials[:, 3]))
+
+        p0 = [M_Z0, GAMMA_Z0, custom_gamma]
 
     else:
-        outliers = True
-        while outliers:
-            popt, pcov = so.curve_fit(lambda x, a, b: func(x, a, b, GAMMA_EE, GAMMA_EE), data[:, 0],
-                                      data[:, 1], p0=[91.179, 2.510], sigma=data[:, 2])[:2]
-            data, outliers = filter_data(data, func, popt)
+        def model(x, a, b):
+            return func(x, a, b, GAMMA_EE, GAMMA_EE)
+
+        def model_jacobian(x, a, b):
+            return func_jacobian(x, a, b, GAMMA_EE, GAMMA_EE)[:, :2]
 
-    return data, popt, pcov, gamma_ee_unknown
+        p0 = [M_Z0, GAMMA_Z0]
+
+    while True:
+        energy, observed, error = all_energy[mask], all_observed[mask], all_error[mask]
+        fit_result = least_squares_fit(model, model_jacobian, energy, observed, error, p0)
+        popt = fit_result.x
+        keep = filter_data(energy, observed, error, func, popt, gamma_ee_unknown,
+                           residuals=fit_result.fun*error)
+        if keep.all():
+            break
+        mask[mask] = keep
 
+    # The last fit was performed on the final data, so its Jacobian gives the covariance
+    pcov = covariance_matrix(fit_result)
 
-def plot_parameter_surface(data, popt, pcov):
+    return (energy, observed, error), popt, pcov, gamma_ee_unknown
+
+
+def save_figure(fig_name):
+    """
+    Saves the current figure in the 'SavedFigures' folder as '{fig_name}({i}).png',
+    where i is one more than the highest index already saved under that name.
+    The existing files are found with a single directory listing.
+
+    :param fig_name: string - name of the figure without the index and extension
+
+    :return: None
+    """
+    import matplotlib.pyplot as plt
+
+    makedirs(FIGURE_FOLDER, exist_ok=True)
+    used_indices = [0]
+    for path in glob(f'{FIGURE_FOLDER}/{fig_name}(*).png'):
+        index_match = fullmatch(rf'{escape(fig_name)}\((\d+)\)\.png', basename(path))
+        if index_match:
+            used_indices.append(int(index_match.group(1)))
+    plt.savefig(f'{FIGURE_FOLDER}/{fig_name}({max(used_indices) + 1}).png', dpi=FIGURE_DPI)
+
+
+def plot_parameter_surface(energy, observed, error, popt, pcov, grid_n=40):
     """
     In the default settings of the script, this function plots the 3D surface
     of chi squared against the two free parameters in the vicinity of the minimum.
     It is meant to provide a visual confirmation for the values of the fitted parameters.
     Saves the plot in 'SavedFigures' folder.
 
-    :param data: np.array of data
+    :param energy: np.array of energy values
+    :param observed: np.array of measured cross section values
+    :param error: np.array of cross section uncertainties
     :param popt: np.array of fitted parameters
     :param pcov: np.array of covariance matrix
+    :param grid_n: int - number of grid points along each parameter axis
 
     :return: None
     """
+    import matplotlib.pyplot as plt
 
     delta_m_z = 1.5 * pcov[0, 0]**0.5
     delta_gamma_z = 1.5 * pcov[1, 1]**0.5
-    m_z_array = np.linspace(popt[0]-delta_m_z, popt[0]+delta_m_z, 100)
-    gamma_z_array = np.linspace(popt[1]-delta_gamma_z, popt[1]+delta_gamma_z, 100)
-    min_chi_squared = chi_square(data, popt, gamma_ee_unknown=False)
-
-    m_z_values = []
-    gamma_z_values = []
-    chi_square_values = []
-    for m_z in m_z_array:
-        for gamma_z in gamma_z_array:
-            m_z_values.append(m_z)
-            gamma_z_values.append(gamma_z)
-            chi_square_values.append(chi_square(data, [m_z, gamma_z], gamma_ee_unknown=False))
-
-    m_z_values = np.array(m_z_values)
-    gamma_z_values = np.array(gamma_z_values)
-    chi_square_values = np.array(chi_square_values)
+    m_z_array = np.linspace(popt[0]-delta_m_z, popt[0]+delta_m_z, grid_n)
+    gamma_z_array = np.linspace(popt[1]-delta_gamma_z, popt[1]+delta_gamma_z, grid_n)
+    min_chi_squared = chi_square(energy, observed, error, popt, gamma_ee_unknown=False)
+
+    m_z_grid, gamma_z_grid = np.meshgrid(m_z_array, gamma_z_array, indexing='ij')
+    chi_square_grid = _chi_square_surface_kernel(energy, observed, error,
+                                                 m_z_array, gamma_z_array)
+
+    m_z_values = m_z_grid.ravel()
+    gamma_z_values = gamma_z_grid.ravel()
+    chi_square_values = chi_square_grid.ravel()
 
     fig_3d = plt.figure()
     plt.rcParams["font.family"] = 'times new roman'
@@ -299,28 +509,19 @@ def plot_parameter_surface(data, popt, pcov):
     ax_3d.set_xlabel('mass of z boson')
     ax_3d.set_ylabel('width of z boson')
 
-    i = 1
-    while True:
-        folder = "SavedFigures"
-        try:
-            mkdir(folder)
-        except FileExistsError:
-            pass
-        fig_name = f'ZBoson_chi_square_surface({i}).png'
-        if not exists(f'{folder}/{fig_name}'):
-            plt.savefig(f'{folder}/{fig_name}', dpi=300)
-            break
-        i += 1
+    save_figure('ZBoson_chi_square_surface')
     plt.show()
 
 
-def plot_fit(data, popt, func=cross_section, gamma_ee_unknown=False):
+def plot_fit(energy, observed, error, popt, func=cross_section, gamma_ee_unknown=False):
     """
     Plots and saves the best fit line alongside the data points.
     Also displays the residuals of the fit. Plots are saved in the
     'SavedFigures' folder in the same directory as the script.
 
-    :param data: np.array of data
+    :param energy: np.array of energy values
+    :param observed: np.array of measured cross section values
+    :param error: np.array of cross section uncertainties
     :param popt: np.array of fitted parameters
     :param func: the expected distribution function
     :param gamma_ee_unknown: True if option to treat partial width of electron-positron
@@ -328,20 +529,21 @@ def plot_fit(data, popt, func=cross_section, gamma_ee_unknown=False):
 
     :return: None
     """
+    import matplotlib.pyplot as plt
 
-    energy_space = np.linspace(data[0, 0], data[-1, 0], 1000)
+    energy_space = np.linspace(energy[0], energy[-1], 1000)
     if len(popt) == 2:
         mode = 'default'
         y_fit = func(energy_space, popt[0], popt[1])
-        y_residuals = data[:, 1] - func(data[:, 0], popt[0], popt[1])
+        y_residuals = observed - func(energy, popt[0], popt[1])
     elif len(popt) == 3 and gamma_ee_unknown:
         mode = 'gamma_ee_unknown'
         y_fit = func(energy_space, popt[0], popt[1], popt[2], popt[2])
-        y_residuals = data[:, 1] - func(data[:, 0], popt[0], popt[1], popt[2], popt[2])
+        y_residuals = observed - func(energy, popt[0], popt[1], popt[2], popt[2])
     else:
         mode = 'different_decay'
         y_fit = func(energy_space, popt[0], popt[1], popt[2])
-        y_residuals = data[:, 1] - func(data[:, 0], popt[0], popt[1], popt[2])
+        y_residuals = observed - func(energy, popt[0], popt[1], popt[2])
 
     # _, [ax1, ax2] = plt.subplots(nrows=2, ncols=1, figsize=(8, 9))
     fig = plt.figure(figsize=(8, 9))
@@ -353,30 +555,20 @@ def plot_fit(data, popt, func=cross_section, gamma_ee_unknown=False):
     ax1.set_title('Cross section best fit to filtered data', y=1.08)
     ax1.set_ylabel('Cross section (nb)')
     ax1.set_xticks([])
-    ax1.errorbar(data[:, 0], data[:, 1], yerr=data[:, 2], fmt='.',
-                 capsize=2, elinewidth=0.3, label='filtered data')
+    # The data points are rasterized, while the fit line, text and axes stay as vectors
+    ax1.errorbar(energy, observed, yerr=error, fmt='.',
+                 capsize=2, elinewidth=0.3, label='filtered data', rasterized=True)
     ax1.plot(energy_space, y_fit, label='Breit-Wigner fit', color='orange')
     ax1.legend()
 
     ax2.set_xlabel('Energy (GeV)')
     ax2.set_ylabel('Residuals (nb)')
-    ax2.errorbar(x=data[:, 0], y=y_residuals, yerr=data[:, 2], fmt='.',
-                 capsize=2, elinewidth=0.3, label='residuals')
-    ax2.hlines(y=0, xmin=data[0, 0], xmax=data[-1, 0], colors='orange')
+    ax2.errorbar(x=energy, y=y_residuals, yerr=error, fmt='.',
+                 capsize=2, elinewidth=0.3, label='residuals', rasterized=True)
+    ax2.hlines(y=0, xmin=energy[0], xmax=energy[-1], colors='orange')
     ax2.legend()
 
-    i = 1
-    while True:
-        folder = "SavedFigures"
-        try:
-            mkdir(folder)
-        except FileExistsError:
-            pass
-        fig_name = f'ZBoson_fit_plot_{mode}({i}).png'
-        if not exists(f'{folder}/{fig_name}'):
-            plt.savefig(f'{folder}/{fig_name}', dpi=300)
-            break
-        i += 1
+    save_figure(f'ZBoson_fit_plot_{mode}')
     plt.show()
 
 
@@ -419,7 +611,7 @@ def collect_results(popt, pcov, chi_squared_red, gamma_ee_unknown):
     return message
 
 
-def run_analysis(data, different_decay, gamma_ee_unknown, custom_gamma=0.01):
+def run_analysis(data, different_decay, gamma_ee_unknown, custom_gamma=0.01, show_surface=False):
     """
     Function which is called in the main loop of the script to conduct the analysis
     by running the previously defined functions in the right order.
@@ -430,19 +622,24 @@ def run_analysis(data, different_decay, gamma_ee_unknown, custom_gamma=0.01):
     :param gamma_ee_unknown: True if option to treat partial width of electron-positron
                              as a free parameter was selected, False otherwise
     :param custom_gamma: float - user's guess for the optional partial widths
+    :param show_surface: True if the chi squared surface plot was requested (only
+                         available with two free parameters), False otherwise
 
     :return: the formatted message from the collect_results function
     """
     if custom_gamma is None:
-        data, popt, pcov, gamma_ee_unknown = fit_to_data(data, different_decay, gamma_ee_unknown)
+        columns, popt, pcov, gamma_ee_unknown = fit_to_data(data, different_decay,
+                                                            gamma_ee_unknown)
     else:
-        data, popt, pcov, gamma_ee_unknown = fit_to_data(data, different_decay,
-                                                         gamma_ee_unknown, float(custom_gamma))
-    chi_squared_red = chi_square(data, popt, gamma_ee_unknown)/(len(data) - len(popt))
+        columns, popt, pcov, gamma_ee_unknown = fit_to_data(data, different_decay,
+                                                            gamma_ee_unknown, float(custom_gamma))
+    energy, observed, error = columns
+    chi_squared_red = chi_square(energy, observed, error, popt,
+                                 gamma_ee_unknown)/(len(energy) - len(popt))
     message = collect_results(popt, pcov, chi_squared_red, gamma_ee_unknown)
-    plot_fit(data, popt, gamma_ee_unknown=gamma_ee_unknown)
-    if len(popt) == 2:
-        plot_parameter_surface(data, popt, pcov)
+    plot_fit(energy, observed, error, popt, gamma_ee_unknown=gamma_ee_unknown)
+    if show_surface and len(popt) == 2:
+        plot_parameter_surface(energy, observed, error, popt, pcov)
 
     return message
 
@@ -524,6 +721,13 @@ def main():
             self.gamma_ee_input = Entry(textvariable=self.gamma_ee, state='disabled')
             self.gamma_ee_input.place(x=330, y=280)
 
+            self.show_surface = BooleanVar()
+            self.show_surface.set(False)
+            self.show_surface_option = Checkbutton(win, text="Display the chi squared surface plot "
+                                                             "(default setup only)",
+                                                   variable=self.show_surface)
+            self.show_surface_option.place(x=30, y=315)
+
             self.confirm_button = Button(win, text="Confirm Selection",
                                          command=self.confirm_selection)
             self.confirm_button.place(x=30, y=350)
@@ -581,10 +785,10 @@ def main():
                     self.sel_2_valid.place(x=550, y=180)
                     self.sel_2_invalid.place(x=-100, y=180)
                     self.display_message('Running the script...')
-                    self.data, message = read_data(self.files)
+                    self.data, message = read_data_cached(self.files)
                     self.display_message(message)
                     output = run_analysis(self.data, self.sel_2.get(), self.sel_3.get(),
-                                          self.gamma_pp.get())
+                                          self.gamma_pp.get(), self.show_surface.get())
                     self.show_output(output)
                 else:
                     self.display_message('Invalid input provided.')
@@ -599,12 +803,12 @@ def main():
                     self.sel_3_invalid.place(x=-100, y=280)
                     self.display_message('Running the script...')
                     if self.sel_1.get() == "Use default files":
-                        self.data, message = read_data(FILE_NAMES)
+                        self.data, message = read_data_cached(FILE_NAMES)
                     else:
-                        self.data, message = read_data(self.files)
+                        self.data, message = read_data_cached(self.files)
                     self.display_message(message)
                     output = run_analysis(self.data, self.sel_2.get(), self.sel_3.get(),
-                                          self.gamma_ee.get())
+                                          self.gamma_ee.get(), self.show_surface.get())
                     self.show_output(output)
                 else:
                     self.display_message('Invalid input provided.')
@@ -614,14 +818,14 @@ def main():
         def get_files(self):
             """
             Uses the default file explorer to allow the user to pick the data files
-            and then passes them on to read_data function before assigning the data
+            and then passes them on to read_data_cached function before assigning the data
             to a variable.
 
             :return: None
             """
             self.files = askopenfilenames()
             try:
-                self.data, message = read_data(self.files)
+                self.data, message = read_data_cached(self.files)
                 self.display_message(message)
                 self.files_selected_msg.place(x=400, y=80)
             except IndexError:
@@ -636,17 +840,12 @@ def main():
             """
             choice = self.file_choice.get()
             if choice == "Choose different files":
-                self.input_files = Button(text="Choose files...", state='normal',
-                                          command=self.get_files)
-                self.input_files.place(x=300, y=80)
+                self.input_files.config(state='normal')
             else:
-                self.input_files = Button(text="Choose files...", state='disabled',
-                                          command=self.get_files)
-                self.input_files.place(x=300, y=80)
+                self.input_files.config(state='disabled')
                 self.sel_2_true.deselect()
                 self.sel_2_false.select()
-                self.gamma_pp_input = Entry(textvariable=self.gamma_pp, state='disabled')
-                self.gamma_pp_input.place(x=330, y=180)
+                self.gamma_pp_input.config(state='disabled')
 
         def allow_gamma_pp(self):
             """
@@ -658,19 +857,14 @@ def main():
             """
             choice = self.sel_2.get()
             if choice:
-                self.gamma_pp_input = Entry(textvariable=self.gamma_pp, state='normal')
-                self.gamma_pp_input.place(x=330, y=180)
+                self.gamma_pp_input.config(state='normal')
                 self.sel_3_true.deselect()
                 self.sel_3_false.select()
-                self.gamma_ee_input = Entry(textvariable=self.gamma_ee, state='disabled')
-                self.gamma_ee_input.place(x=330, y=280)
+                self.gamma_ee_input.config(state='disabled')
                 self.file_choice.set("Choose different files")
-                self.input_files = Button(text="Choose files...", state='normal',
-                                          command=self.get_files)
-                self.input_files.place(x=300, y=80)
+                self.input_files.config(state='normal')
             else:
-                self.gamma_pp_input = Entry(textvariable=self.gamma_pp, state='disabled')
-                self.gamma_pp_input.place(x=330, y=180)
+                self.gamma_pp_input.config(state='disabled')
 
         def allow_gamma_ee(self):
             """
@@ -683,11 +877,9 @@ def main():
             choice = self.sel_3.get()
             different_decay = self.sel_2.get()
             if choice and not different_decay:
-                self.gamma_ee_input = Entry(textvariable=self.gamma_ee, state='normal')
-                self.gamma_ee_input.place(x=330, y=280)
+                self.gamma_ee_input.config(state='normal')
             else:
-                self.gamma_ee_input = Entry(textvariable=self.gamma_ee, state='disabled')
-                self.gamma_ee_input.place(x=330, y=280)
+                self.gamma_ee_input.config(state='disabled')
                 self.sel_3_false.select()
                 self.sel_3_true.deselect()
 
@@ -698,9 +890,10 @@ def main():
             :return: None
             """
             self.display_message('Running the script...')
-            self.data, message = read_data(FILE_NAMES)
+            self.data, message = read_data_cached(FILE_NAMES)
             self.display_message(message)
-            output = run_analysis(self.data, False, False)
+            output = run_analysis(self.data, False, False,
+                                  show_surface=self.show_surface.get())
             self.show_output(output)
 
         def show_output(self, output):